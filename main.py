@@ -6,30 +6,217 @@ Integrado com APIs reais: Yahoo Finance e Alpha Vantage
 
 import numpy as np
 import matplotlib.pyplot as plt
-from qiskit import QuantumCircuit
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from scipy.linalg import cho_factor, cho_solve
+from scipy.linalg.blas import dsymv
+from qiskit import QuantumCircuit, transpile
 from qiskit.circuit.library import QAOAAnsatz
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import SparsePauliOp, Statevector
 from qiskit_algorithms import QAOA
 from qiskit_algorithms.optimizers import COBYLA
 from qiskit_optimization import QuadraticProgram
-from qiskit_optimization.algorithms import MinimumEigenOptimizer
+from qiskit_optimization.algorithms import OptimizationResult, OptimizationResultStatus
 from qiskit_optimization.converters import QuadraticProgramToQubo
 import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import warnings
 warnings.filterwarnings('ignore')
 
+# orjson é opcional: decodifica as respostas das APIs mais rápido que o json padrão
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Numba é opcional: sem ele os kernels de risco/retorno rodam em NumPy
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # ============================================================================
 # 1. INTEGRAÇÃO COM APIs DE DADOS REAIS
 # ============================================================================
 
+# As buscas rodam em threads: serializar as mensagens para não misturar linhas
+_log_lock = threading.Lock()
+
+
+def log(message):
+    """Imprime uma mensagem de status de forma segura entre threads"""
+    with _log_lock:
+        print(message, flush=True)
+
+
+def parse_json(response):
+    """Decodifica o corpo JSON da resposta HTTP (orjson se disponível)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+class FileCache:
+    """Cache em disco (JSON) de séries de preços, com tempo de validade"""
+    
+    def __init__(self, cache_dir='.cache', ttl=24 * 3600):
+        """
+        cache_dir: diretório raiz do cache
+        ttl: validade das entradas em segundos (padrão: 24h)
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+    
+    def _path(self, source, ticker, period):
+        return os.path.join(self.cache_dir, source, f"{ticker}_{period}.json")
+    
+    def get(self, source, ticker, period):
+        """Retorna o DataFrame em cache ou None se ausente/expirado"""
+        path = self._path(source, ticker, period)
+        
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            
+            if time.time() - payload.get('timestamp', 0) > self.ttl:
+                return None
+            
+            return pd.DataFrame({
+                'date': pd.to_datetime(payload['date']),
+                'close': payload['close']
+            })
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Entrada ausente, corrompida ou incompleta: tratar como ausência no cache
+            return None
+    
+    def set(self, source, ticker, period, df):
+        """Grava o DataFrame (colunas date, close) no cache"""
+        path = self._path(source, ticker, period)
+        
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            payload = {
+                'timestamp': time.time(),
+                'date': df['date'].dt.strftime('%Y-%m-%dT%H:%M:%S').tolist(),
+                'close': df['close'].tolist()
+            }
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+        except OSError as e:
+            log(f"   ⚠️ Não foi possível gravar cache de {ticker}: {e}")
+
+
+class RateLimiter:
+    """Garante um intervalo mínimo entre requisições, compartilhado entre threads"""
+    
+    def __init__(self, min_interval):
+        """min_interval: segundos mínimos entre duas requisições consecutivas"""
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+    
+    def wait(self):
+        """Bloqueia até o próximo horário livre e o reserva para esta requisição"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.min_interval
+        
+        if start > now:
+            time.sleep(start - now)
+
+
+def cached_fetch(source, default_period):
+    """
+    Decorator para os métodos fetch_*: consulta o cache em memória (L1)
+    e em disco (L2) antes de chamar a API
+    Com cache_only=True retorna apenas o que estiver em cache (ou None), sem requisição
+    """
+    def decorator(fetch):
+        @functools.wraps(fetch)
+        def wrapper(self, ticker, *args, cache_only=False, **kwargs):
+            period = args[0] if args else kwargs.get('period', default_period)
+            key = (source, ticker, period)
+            
+            df = self.cache.get(key)
+            if df is None:
+                df = self.file_cache.get(source, ticker, period)
+                if df is not None:
+                    self.cache[key] = df
+            
+            if df is not None:
+                with self._stats_lock:
+                    self.cache_hits += 1
+                log(f"   ✓ {ticker}: {len(df)} dias de dados (cache)")
+                return df
+            
+            if cache_only:
+                return None
+            
+            with self._stats_lock:
+                self.cache_misses += 1
+            df = fetch(self, ticker, *args, **kwargs)
+            
+            if df is not None and not df.empty:
+                self.cache[key] = df
+                self.file_cache.set(source, ticker, period, df)
+            
+            return df
+        return wrapper
+    return decorator
+
+
 class MarketDataFetcher:
     """Busca dados reais de mercado usando múltiplas APIs"""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache_dir='.cache', cache_ttl=24 * 3600):
+        """
+        api_key: chave da Alpha Vantage (opcional)
+        cache_dir: diretório do cache em disco das respostas
+        cache_ttl: validade do cache em segundos (padrão: 24h)
+        """
         self.api_key = api_key
         self.cache = {}
+        self.file_cache = FileCache(cache_dir, cache_ttl)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
+        
+        # Intervalo mínimo entre requisições de cada fonte (vale para todas as threads)
+        # Alpha Vantage gratuita: 5 requisições/minuto -> uma a cada 12s
+        self._rate_limits = {
+            'yahoo': RateLimiter(0.5),
+            'brapi': RateLimiter(0.5),
+            'alpha_vantage': RateLimiter(12.0)
+        }
         
+        # Sessão HTTP compartilhada: reaproveita conexões (keep-alive) e
+        # repete requisições com falhas transitórias
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    @cached_fetch('yahoo', '1y')
     def fetch_yahoo_finance(self, ticker, period='1y'):
         """
         Busca dados do Yahoo Finance (API gratuita)
@@ -48,22 +235,21 @@ class MarketDataFetcher:
                 'range': period
             }
             
-            # Adicionar delay para evitar rate limit
-            import time
-            time.sleep(0.5)
+            # Espaçar requisições para evitar rate limit
+            self._rate_limits['yahoo'].wait()
             
-            response = requests.get(f"{base_url}{ticker}", params=params, timeout=10)
+            response = self.session.get(f"{base_url}{ticker}", params=params, timeout=10)
             
             if response.status_code == 429:
-                print(f"   ⚠️ {ticker}: Limite de requisições atingido (aguarde)")
+                log(f"   ⚠️ {ticker}: Limite de requisições atingido (aguarde)")
                 time.sleep(2)
                 return None
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 
                 if 'chart' not in data or 'result' not in data['chart']:
-                    print(f"   ✗ {ticker}: Resposta inválida")
+                    log(f"   ✗ {ticker}: Resposta inválida")
                     return None
                 
                 result = data['chart']['result'][0]
@@ -82,27 +268,28 @@ class MarketDataFetcher:
                 df = df.dropna()
                 
                 if len(df) > 0:
-                    print(f"   ✓ {ticker}: {len(df)} dias de dados")
+                    log(f"   ✓ {ticker}: {len(df)} dias de dados")
                     return df
                 else:
-                    print(f"   ✗ {ticker}: Sem dados válidos")
+                    log(f"   ✗ {ticker}: Sem dados válidos")
                     return None
                 
             else:
-                print(f"   ✗ Erro ao buscar {ticker}: Status {response.status_code}")
+                log(f"   ✗ Erro ao buscar {ticker}: Status {response.status_code}")
                 return None
                 
         except Exception as e:
-            print(f"   ✗ Erro {ticker}: {str(e)}")
+            log(f"   ✗ Erro {ticker}: {str(e)}")
             return None
     
+    @cached_fetch('alpha_vantage', 'full')
     def fetch_alpha_vantage(self, ticker):
         """
         Busca dados da Alpha Vantage (requer API key gratuita)
         Registre-se em: https://www.alphavantage.co/support/#api-key
         """
         if not self.api_key:
-            print("   ⚠️ Alpha Vantage requer API key (gratuita)")
+            log("   ⚠️ Alpha Vantage requer API key (gratuita)")
             return None
         
         try:
@@ -117,28 +304,33 @@ class MarketDataFetcher:
                 'apikey': self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
+            self._rate_limits['alpha_vantage'].wait()
+            response = self.session.get(url, params=params, timeout=10)
+            data = parse_json(response)
             
             if 'Time Series (Daily)' in data:
-                df = pd.DataFrame.from_dict(data['Time Series (Daily)'], orient='index')
-                df.index = pd.to_datetime(df.index)
-                df = df.sort_index()
-                df['close'] = df['4. close'].astype(float)
-                df = df[['close']]
-                df = df.reset_index()
-                df.columns = ['date', 'close']
+                # Extrair apenas o fechamento, sem montar as demais colunas OHLCV
+                ts = data['Time Series (Daily)']
+                dates = np.array(list(ts.keys()), dtype='datetime64[D]')
+                closes = np.fromiter(
+                    (float(v['4. close']) for v in ts.values()),
+                    dtype=np.float64,
+                    count=len(ts)
+                )
+                df = pd.DataFrame({'date': dates, 'close': closes})
+                df = df.sort_values('date').reset_index(drop=True)
                 
-                print(f"   ✓ {ticker}: {len(df)} dias de dados")
+                log(f"   ✓ {ticker}: {len(df)} dias de dados")
                 return df
             else:
-                print(f"   ✗ Alpha Vantage: {data.get('Note', 'Erro desconhecido')}")
+                log(f"   ✗ Alpha Vantage: {data.get('Note', 'Erro desconhecido')}")
                 return None
                 
         except Exception as e:
-            print(f"   ✗ Erro Alpha Vantage {ticker}: {str(e)}")
+            log(f"   ✗ Erro Alpha Vantage {ticker}: {str(e)}")
             return None
     
+    @cached_fetch('brapi', '1y')
     def fetch_brapi(self, ticker):
         """
         Busca dados da BRAPI (API brasileira gratuita)
@@ -155,10 +347,11 @@ class MarketDataFetcher:
                 'fundamental': 'false'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            self._rate_limits['brapi'].wait()
+            response = self.session.get(url, params=params, timeout=10)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 
                 if 'results' in data and len(data['results']) > 0:
                     result = data['results'][0]
@@ -173,23 +366,55 @@ class MarketDataFetcher:
                         df = df.dropna()
                         
                         if len(df) > 0:
-                            print(f"   ✓ {clean_ticker}: {len(df)} dias de dados")
+                            log(f"   ✓ {clean_ticker}: {len(df)} dias de dados")
                             return df
                 
-                print(f"   ✗ BRAPI: Sem dados para {clean_ticker}")
+                log(f"   ✗ BRAPI: Sem dados para {clean_ticker}")
                 return None
             else:
-                print(f"   ✗ BRAPI erro: Status {response.status_code}")
+                log(f"   ✗ BRAPI erro: Status {response.status_code}")
                 return None
                 
         except Exception as e:
-            print(f"   ✗ Erro BRAPI {ticker}: {str(e)}")
+            log(f"   ✗ Erro BRAPI {ticker}: {str(e)}")
             return None
     
-    def get_market_data(self, tickers, source='yahoo', period='1y'):
+    def _fetch_ticker(self, ticker, source, period):
+        """Busca um único ativo na fonte indicada ('auto' tenta todas)"""
+        df = None
+        
+        if source == 'auto':
+            # Tentar múltiplas fontes, na ordem de preferência
+            fetchers = [
+                (self.fetch_brapi, ()),
+                (self.fetch_yahoo_finance, (period,)),
+                (self.fetch_alpha_vantage, ())
+            ]
+            
+            # Consultar o cache de todas as fontes antes de qualquer requisição
+            for fetch, args in fetchers:
+                df = fetch(ticker, *args, cache_only=True)
+                if df is not None:
+                    return df
+            
+            for fetch, args in fetchers:
+                df = fetch(ticker, *args)
+                if df is not None and not df.empty:
+                    break
+        elif source == 'yahoo':
+            df = self.fetch_yahoo_finance(ticker, period)
+        elif source == 'brapi':
+            df = self.fetch_brapi(ticker)
+        elif source == 'alpha_vantage':
+            df = self.fetch_alpha_vantage(ticker)
+        
+        return df
+    
+    def get_market_data(self, tickers, source='yahoo', period='1y', max_workers=8):
         """
-        Busca dados de múltiplos ativos
+        Busca dados de múltiplos ativos em paralelo
         source: 'yahoo', 'alpha_vantage', 'brapi', ou 'auto' (tenta todos)
+        max_workers: número máximo de requisições simultâneas
         """
         print(f"\n🌐 Buscando dados de mercado ({source.upper()})...")
         print(f"   Período: {period}")
@@ -197,37 +422,78 @@ class MarketDataFetcher:
         
         data_dict = {}
         
-        for ticker in tickers:
-            df = None
-            
-            if source == 'auto':
-                # Tentar múltiplas fontes
-                df = self.fetch_brapi(ticker)
-                if df is None or df.empty:
-                    df = self.fetch_yahoo_finance(ticker, period)
-                if df is None or df.empty:
-                    df = self.fetch_alpha_vantage(ticker)
-            elif source == 'yahoo':
-                df = self.fetch_yahoo_finance(ticker, period)
-            elif source == 'brapi':
-                df = self.fetch_brapi(ticker)
-            elif source == 'alpha_vantage':
-                df = self.fetch_alpha_vantage(ticker)
+        # Requisições são I/O-bound e independentes: buscar todos os ativos ao mesmo tempo
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda ticker: self._fetch_ticker(ticker, source, period),
+                tickers
+            )
             
-            if df is not None and not df.empty:
-                data_dict[ticker] = df
+            for ticker, df in zip(tickers, results):
+                if df is not None and not df.empty:
+                    data_dict[ticker] = df
         
         if len(data_dict) == 0:
             print("\n❌ Nenhum dado foi obtido!")
             return None
         
         print(f"\n✅ Dados obtidos para {len(data_dict)} ativos")
+        print(f"   💾 Cache: {self.cache_hits} acertos, {self.cache_misses} buscas na API")
         return data_dict
 
 # ============================================================================
 # 2. ANÁLISE DE DADOS REAIS
 # ============================================================================
 
+def _portfolio_stats_numpy(W, mu, cov):
+    returns = W @ mu
+    risks = np.sqrt(np.einsum('ij,jk,ik->i', W, cov, W))
+    return returns, risks
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _portfolio_stats_numba(W, mu, cov):
+        # Kernel fundido: acumula w_i * cov[i, j] * w_j sem alocar Σw
+        n_portfolios, n_assets = W.shape
+        returns = np.empty(n_portfolios)
+        risks = np.empty(n_portfolios)
+        
+        for p in prange(n_portfolios):
+            ret = 0.0
+            var = 0.0
+            for i in range(n_assets):
+                acc = 0.0
+                for j in range(n_assets):
+                    acc += cov[i, j] * W[p, j]
+                ret += W[p, i] * mu[i]
+                var += W[p, i] * acc
+            returns[p] = ret
+            risks[p] = np.sqrt(var)
+        
+        return returns, risks
+
+# Abaixo deste volume de trabalho (portfolios × ativos²) a compilação JIT não compensa
+NUMBA_MIN_WORK = 10**7
+
+
+def portfolio_stats(W, mu, cov):
+    """
+    Retorno esperado e risco (volatilidade) de um lote de portfolios
+    W: matriz (n_portfolios, n_assets), uma linha de pesos por portfolio
+    """
+    n_portfolios, n_assets = W.shape
+    
+    if NUMBA_AVAILABLE and n_portfolios * n_assets ** 2 >= NUMBA_MIN_WORK:
+        return _portfolio_stats_numba(
+            np.ascontiguousarray(W, dtype=np.float64),
+            np.ascontiguousarray(mu, dtype=np.float64),
+            np.ascontiguousarray(cov, dtype=np.float64)
+        )
+    
+    return _portfolio_stats_numpy(W, mu, cov)
+
+
 class PortfolioData:
     """Classe para gerenciar dados de ações com integração de APIs"""
     
@@ -247,13 +513,13 @@ class PortfolioData:
         
         self.assets = ['PETR4', 'VALE3', 'ITUB4', 'BBDC4', 'MGLU3']
         self.expected_returns = np.array([15.2, 18.5, 12.3, 11.8, 8.5])
-        self.cov_matrix = np.array([
+        self.cov_matrix = np.asfortranarray([
             [0.0625, 0.0312, 0.0156, 0.0125, 0.0094],
             [0.0312, 0.0900, 0.0200, 0.0180, 0.0120],
             [0.0156, 0.0200, 0.0400, 0.0300, 0.0100],
             [0.0125, 0.0180, 0.0300, 0.0361, 0.0090],
             [0.0094, 0.0120, 0.0100, 0.0090, 0.0484]
-        ])
+        ], dtype=np.float64)
         self.prices = np.array([28.50, 65.30, 24.80, 14.20, 3.15])
         self.data_source = "simulado"
     
@@ -265,18 +531,15 @@ class PortfolioData:
         self.market_data = market_data
         self.data_source = "API real"
         
-        # Calcular retornos diários
-        returns_dict = {}
+        # Fechamentos alinhados por data (intersecção), uma coluna por ativo
+        closes = pd.concat(
+            [df.set_index('date')['close'].rename(t) for t, df in market_data.items()],
+            axis=1,
+            join='inner'
+        ).sort_index().dropna()
         
-        for ticker, df in market_data.items():
-            df = df.sort_values('date').copy()
-            df = df.set_index('date')  # Define data como índice
-            df['returns'] = df['close'].pct_change()
-            returns_dict[ticker] = df['returns'].dropna()
-            
-        # Alinhar datas (intersecção)
-        all_returns = pd.DataFrame(returns_dict)
-        all_returns = all_returns.dropna()
+        # Calcular retornos diários de todos os ativos de uma vez
+        all_returns = closes.pct_change().dropna()
         
         # Estatísticas
         print(f"   • Período analisado: {len(all_returns)} dias")
@@ -292,28 +555,29 @@ class PortfolioData:
         # Retornos esperados anualizados (%)
         self.expected_returns = (all_returns.mean() * 252 * 100).values
         
-        # Matriz de covariância anualizada
-        self.cov_matrix = all_returns.cov().values * 252
+        # Matriz de covariância anualizada (float64, ordem Fortran para BLAS)
+        self.cov_matrix = np.asfortranarray(all_returns.cov().values * 252, dtype=np.float64)
         
-        # Preço atual (último preço)
-        self.prices = np.array([
-            market_data[ticker]['close'].iloc[-1] 
-            for ticker in self.assets
-        ])
+        # Preço atual (último preço na última data comum a todos os ativos)
+        self.prices = closes.iloc[-1].to_numpy()
         
         # Mostrar estatísticas
         print("\n   📊 Estatísticas dos Ativos:")
-        stats_df = pd.DataFrame({
-            'Ativo': self.assets,
-            'Retorno Anual (%)': self.expected_returns,
-            'Volatilidade (%)': np.sqrt(np.diag(self.cov_matrix)) * 100,
-            'Preço Atual (R$)': self.prices
-        })
-        print(stats_df.to_string(index=False))
+        header = f"{'Ativo':<10}{'Retorno Anual (%)':>20}{'Volatilidade (%)':>20}{'Preço Atual (R$)':>20}"
+        rows = [
+            f"{a:<10}{r:>20.2f}{v:>20.2f}{p:>20.2f}"
+            for a, r, v, p in zip(self.assets,
+                                  self.expected_returns,
+                                  np.sqrt(np.diag(self.cov_matrix)) * 100,
+                                  self.prices)
+        ]
+        print('\n'.join([header] + rows))
         
     def get_risk(self, weights):
         """Calcula risco do portfolio (volatilidade)"""
-        return np.sqrt(np.dot(weights.T, np.dot(self.cov_matrix, weights)))
+        # dsymv explora a simetria de Σ: lê apenas um triângulo da matriz
+        weights = np.asarray(weights, dtype=np.float64)
+        return np.sqrt(weights @ dsymv(1.0, self.cov_matrix, weights, lower=1))
     
     def get_return(self, weights):
         """Calcula retorno esperado do portfolio"""
@@ -326,6 +590,22 @@ class PortfolioData:
 class QuantumPortfolioOptimizer:
     """Otimizador quântico de portfolio usando QAOA"""
     
+    # Conversões já feitas: chave do problema -> (converter, qubo, H, offset)
+    _qubo_cache = {}
+    
+    # Circuitos já transpilados: (chave do problema, reps) -> circuito parametrizado
+    _transpiled_cache = {}
+    
+    # Limites do número de ativos selecionados
+    MIN_ASSETS = 2
+    MAX_ASSETS = 4
+    
+    # Maior problema resolvido por enumeração exata (2^n combinações)
+    MAX_ENUM_ASSETS = 20
+    
+    # Combinações avaliadas por bloco na enumeração (limita a memória a ~10 MB por bloco)
+    ENUM_CHUNK_SIZE = 1 << 16
+    
     def __init__(self, data, budget=10000, risk_aversion=0.5):
         self.data = data
         self.budget = budget
@@ -340,125 +620,189 @@ class QuantumPortfolioOptimizer:
         qp = QuadraticProgram('portfolio_optimization')
         
         # Variáveis binárias: x[i] = 1 se incluir ação i no portfolio
-        for i in range(self.n_assets):
-            qp.binary_var(name=f'x_{i}')
+        names = [f'x_{i}' for i in range(self.n_assets)]
+        for name in names:
+            qp.binary_var(name=name)
         
-        # Coeficientes lineares (retornos esperados)
-        linear = {}
-        for i in range(self.n_assets):
-            linear[f'x_{i}'] = -self.data.expected_returns[i]  # Negativo para maximizar
+        # Coeficientes lineares (retornos esperados, negativos para maximizar)
+        linear = dict(zip(names, -self.data.expected_returns))
         
-        # Coeficientes quadráticos (penalização por risco)
-        quadratic = {}
-        for i in range(self.n_assets):
-            for j in range(self.n_assets):
-                if i <= j:
-                    key = (f'x_{i}', f'x_{j}')
-                    quadratic[key] = self.risk_aversion * self.data.cov_matrix[i, j]
+        # Coeficientes quadráticos (penalização por risco): triângulo superior i <= j
+        Q = self.risk_aversion * self.data.cov_matrix
+        iu, ju = np.triu_indices(self.n_assets)
+        quadratic = {(names[i], names[j]): Q[i, j] for i, j in zip(iu, ju)}
         
         # Função objetivo
         qp.minimize(linear=linear, quadratic=quadratic)
         
         # Restrição: selecionar pelo menos 2 e no máximo 4 ativos
-        constraint_linear = {f'x_{i}': 1 for i in range(self.n_assets)}
+        constraint_linear = dict.fromkeys(names, 1)
         qp.linear_constraint(
             linear=constraint_linear,
             sense='>=',
-            rhs=2,
+            rhs=self.MIN_ASSETS,
             name='min_assets'
         )
         qp.linear_constraint(
             linear=constraint_linear,
             sense='<=',
-            rhs=4,
+            rhs=self.MAX_ASSETS,
             name='max_assets'
         )
         
         return qp
     
-    def optimize_quantum(self, reps=3):
+    def optimize_quantum(self, reps=3, optimizer='cobyla', use_quantum=True):
         """
         Executa otimização quântica usando QAOA
         reps: número de camadas do circuito QAOA
+        optimizer: 'cobyla' (um ponto por passo) ou 'de' (evolução diferencial,
+                   cada geração avaliada em uma única chamada ao estimator)
+        use_quantum: se False, resolve por enumeração clássica exata
         """
-        print("🔬 Iniciando otimização quântica com QAOA...")
+        if optimizer not in ('cobyla', 'de'):
+            raise ValueError(f"Otimizador desconhecido: {optimizer!r} (use 'cobyla' ou 'de')")
         
-        try:
-            # Criar problema QUBO
+        if not use_quantum:
+            print("🧮 Iniciando otimização clássica por enumeração...")
             qp = self.create_qubo_problem()
             print(f"\n📊 Problema criado: {self.n_assets} ativos")
+            result = self._enumerate_solve(qp)
+            result.method = 'classical'
+            return result, qp
+        
+        print("🔬 Iniciando otimização quântica com QAOA...")
+        
+        # Criar problema QUBO (antes do try: o fallback clássico também o utiliza)
+        qp = self.create_qubo_problem()
+        print(f"\n📊 Problema criado: {self.n_assets} ativos")
+        
+        try:
+            # Converter para QUBO e Hamiltoniano de custo (forma de Ising),
+            # reaproveitando a conversão se os dados forem os mesmos
+            problem_key = self._problem_key()
+            cached = self._qubo_cache.get(problem_key)
             
-            # Converter para QUBO
-            converter = QuadraticProgramToQubo()
-            qubo = converter.convert(qp)
-            
-            # Configurar otimizador
-            optimizer = COBYLA(maxiter=100)
+            if cached is None:
+                converter = QuadraticProgramToQubo()
+                qubo = converter.convert(qp)
+                hamiltonian, offset = qubo.to_ising()
+                self._qubo_cache[problem_key] = (converter, qubo, hamiltonian, offset)
+            else:
+                converter, qubo, hamiltonian, offset = cached
+                print("   ✓ Conversão QUBO/Ising reaproveitada (cache)")
             
-            # Tentar usar SamplingVQE com primitives v2
-            sampler = None
-            sampler_name = "desconhecido"
+            # Estimator exato (statevector): avalia <ψ(θ)|H|ψ(θ)> sem ruído de amostragem
+            estimator = StatevectorEstimator()
+            print("   ✓ Usando: StatevectorEstimator")
             
-            try:
-                # Tentar v2 API (mais recente)
-                from qiskit_aer.primitives import SamplerV2
-                sampler = SamplerV2()
-                sampler_name = "Aer SamplerV2"
-                print(f"   ✓ Usando: {sampler_name}")
-            except ImportError:
-                pass
-            
-            if sampler is None:
-                try:
-                    # Tentar v1 API (compatibilidade)
-                    from qiskit_aer.primitives import Sampler
-                    from qiskit.utils import algorithm_globals
-                    
-                    # Configurar seed para reprodutibilidade
-                    algorithm_globals.random_seed = 42
-                    sampler = Sampler()
-                    sampler_name = "Aer Sampler V1"
-                    print(f"   ✓ Usando: {sampler_name}")
-                except Exception as e:
-                    print(f"   ⚠️ Erro ao criar Sampler V1: {e}")
-            
-            if sampler is None:
-                raise ImportError(
-                    "❌ Não foi possível criar um Sampler compatível.\n"
-                    "Execute: pip install --upgrade qiskit-aer"
-                )
+            print("   🔄 Configurando circuito QAOA...")
             
-            # Criar QAOA com configuração adaptada
-            from qiskit_algorithms import SamplingVQE
-            from qiskit.circuit.library import TwoLocal
+            num_qubits = hamiltonian.num_qubits
             
-            print("   🔄 Configurando circuito variacional...")
+            # Transpilar o ansatz uma única vez; as iterações só associam parâmetros
+            cache_key = (problem_key, reps)
+            transpiled = self._transpiled_cache.get(cache_key)
             
-            # Criar ansatz manualmente para maior compatibilidade
-            num_qubits = qubo.num_vars
-            ansatz = TwoLocal(
-                num_qubits=num_qubits,
-                rotation_blocks='ry',
-                entanglement_blocks='cz',
-                entanglement='linear',
-                reps=reps
-            )
+            if transpiled is None:
+                from qiskit_aer import AerSimulator
+                
+                # Ordenar termos ZZ em camadas paralelas antes de montar o circuito
+                ansatz = QAOAAnsatz(self._schedule_cost_terms(hamiltonian), reps=reps)
+                transpiled = transpile(ansatz, AerSimulator(), optimization_level=3)
+                self._transpiled_cache[cache_key] = transpiled
+                print("   ✓ Circuito transpilado")
+            else:
+                print("   ✓ Circuito transpilado reaproveitado (cache)")
             
             print(f"   📐 Circuito: {num_qubits} qubits, {reps} camadas")
             
-            # Usar SamplingVQE em vez de QAOA direto (mais robusto)
-            vqe = SamplingVQE(
-                sampler=sampler,
-                ansatz=ansatz,
-                optimizer=optimizer
-            )
+            # Observável alinhado ao layout do circuito transpilado
+            observable = hamiltonian.apply_layout(transpiled.layout)
+            
+            # Valor esperado exato do QUBO (<H> + constante) para um lote de
+            # parâmetros (K, n_params): um único PUB, uma única chamada ao estimator
+            estimator_calls = [0]
+            
+            def evaluate(params_batch):
+                estimator_calls[0] += 1
+                pub = (transpiled, observable, params_batch)
+                evs = estimator.run([pub]).result()[0].data.evs
+                return np.asarray(evs, dtype=float) + offset
+            
+            # Os otimizadores podem revisitar pontos: memorizar avaliações por
+            # parâmetros arredondados, mas avaliar sempre no ponto pedido
+            evaluations = {}
+            cache_stats = {'hits': 0}
+            
+            def objective_batch(params_batch):
+                keys = [tuple(np.round(params, 6)) for params in params_batch]
+                missing = {}
+                for key, params in zip(keys, params_batch):
+                    if key in evaluations or key in missing:
+                        cache_stats['hits'] += 1
+                    else:
+                        missing[key] = params
+                
+                if missing:
+                    values = evaluate(np.array(list(missing.values())))
+                    evaluations.update(zip(missing, values))
+                
+                return np.array([evaluations[key] for key in keys])
             
             print("   ⚙️ Executando otimização quântica...")
             
-            # Resolver usando MinimumEigenOptimizer
-            qaoa_optimizer = MinimumEigenOptimizer(vqe)
-            result = qaoa_optimizer.solve(qubo)
+            num_params = transpiled.num_parameters
+            
+            if optimizer == 'de':
+                from scipy.optimize import differential_evolution
+                
+                # vectorized=True: o scipy entrega a geração inteira como (n_params, K)
+                opt_result = differential_evolution(
+                    lambda x: objective_batch(x.T),
+                    bounds=[(0, 2 * np.pi)] * num_params,
+                    maxiter=20,
+                    popsize=5,
+                    tol=1e-3,
+                    seed=42,
+                    polish=False,
+                    updating='deferred',
+                    vectorized=True
+                )
+                
+                # Decodificar toda a população final (scipy >= 1.12), não só o melhor <H>
+                candidates = getattr(opt_result, 'population', opt_result.x[np.newaxis])
+            else:
+                opt_result = COBYLA(maxiter=100).minimize(
+                    fun=lambda params: objective_batch(params[np.newaxis])[0],
+                    x0=np.full(num_params, np.pi / 4)
+                )
+                candidates = opt_result.x[np.newaxis]
+            
+            print(f"   💾 Cache do objetivo: {cache_stats['hits']} acertos, "
+                  f"{len(evaluations)} avaliações em {estimator_calls[0]} chamadas ao estimator")
+            
+            # Amostrar os circuitos finais e escolher o melhor bitstring observado
+            # (valor do QUBO do bitstring, não o menor <H>)
+            x_qubo = min(
+                (np.array([int(b) for b in reversed(bits)])
+                 for params in candidates
+                 for bits in self._sample(transpiled, params)),
+                key=qubo.objective.evaluate
+            )
+            
+            x = converter.interpret(x_qubo)
+            
+            result = OptimizationResult(
+                x=x,
+                fval=qp.objective.evaluate(x),
+                variables=qp.variables,
+                status=OptimizationResultStatus.SUCCESS
+                if qp.is_feasible(x) else OptimizationResultStatus.INFEASIBLE
+            )
             
+            # Método que produziu o resultado: 'quantum' (QAOA) ou 'classical'
+            result.method = 'quantum'
             return result, qp
             
         except Exception as e:
@@ -475,13 +819,15 @@ class QuantumPortfolioOptimizer:
                     solver = CplexOptimizer()
                     result = solver.solve(qp)
                     print("   ✓ Usando solver CPLEX")
+                    result.method = 'classical'
                     return result, qp
                 except:
                     pass
                 
                 # Se CPLEX não estiver disponível, usar força bruta
                 print("   ⚙️ Usando método de enumeração...")
-                result = self._brute_force_solve(qp)
+                result = self._enumerate_solve(qp)
+                result.method = 'classical'
                 return result, qp
                 
             except Exception as e2:
@@ -489,58 +835,105 @@ class QuantumPortfolioOptimizer:
                 print("\n💡 Use dados simulados: USE_REAL_DATA = False")
                 raise e
     
-    def _brute_force_solve(self, qp):
-        """Solução por força bruta para problemas pequenos"""
-        from qiskit_optimization import QuadraticProgramElement
-        import itertools
+    def _problem_key(self):
+        """Identifica o problema pelo que o define (retornos, covariância, aversão, limites)"""
+        h = hashlib.md5()
+        h.update(np.ascontiguousarray(self.data.expected_returns, dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(self.data.cov_matrix, dtype=np.float64).tobytes())
+        h.update(np.float64(self.risk_aversion).tobytes())
+        h.update(np.array([self.MIN_ASSETS, self.MAX_ASSETS], dtype=np.int64).tobytes())
+        return h.hexdigest()
+    
+    @staticmethod
+    def _schedule_cost_terms(hamiltonian):
+        """
+        Reordena os termos do Hamiltoniano de custo para reduzir a profundidade
+        
+        Os termos Z/ZZ comutam entre si, então a ordem é livre. Os pares de
+        qubits são agrupados por coloração de arestas round-robin (n-1 camadas
+        para o grafo completo), de modo que termos em pares disjuntos fiquem
+        adjacentes e executem em paralelo no circuito.
+        """
+        n = hamiltonian.num_qubits
+        m = n + n % 2  # número par de vértices (um fictício se n for ímpar)
+        
+        # Camada de cada par (i, j): rodízio com o último vértice fixo
+        layer_of = {}
+        others = list(range(m - 1))
+        for r in range(m - 1):
+            rotated = others[r:] + others[:r]
+            layer_of[frozenset((rotated[0], m - 1))] = r
+            for k in range(1, m // 2):
+                layer_of[frozenset((rotated[k], rotated[-k]))] = r
+        
+        singles = []
+        pairs = []
+        for label, coeff in hamiltonian.to_list():
+            qubits = frozenset(i for i, c in enumerate(reversed(label)) if c != 'I')
+            if len(qubits) == 2:
+                pairs.append((layer_of[qubits], label, coeff))
+            else:
+                singles.append((label, coeff))
         
-        n = qp.get_num_vars()
-        best_solution = None
-        best_value = float('inf')
+        pairs.sort(key=lambda term: term[0])
+        return SparsePauliOp.from_list(singles + [(label, coeff) for _, label, coeff in pairs])
+    
+    @staticmethod
+    def _sample(circuit, params, shots=1024, seed=42):
+        """Amostra medições do estado final do circuito: {bitstring: contagem}"""
+        state = Statevector(circuit.assign_parameters(params))
+        state.seed(seed)
+        return state.sample_counts(shots)
+    
+    def _enumerate_solve(self, qp):
+        """
+        Solução exata por enumeração vetorizada (viável para até MAX_ENUM_ASSETS ativos)
+        Avalia o objetivo dos subconjuntos viáveis com NumPy, em blocos de
+        ENUM_CHUNK_SIZE combinações para limitar o uso de memória
+        """
+        n = self.n_assets
+        if n > self.MAX_ENUM_ASSETS:
+            raise ValueError(
+                f"Enumeração limitada a {self.MAX_ENUM_ASSETS} ativos (recebido: {n})"
+            )
         
         print(f"   🔍 Avaliando {2**n} combinações possíveis...")
         
-        # Testar todas as combinações
-        for bits in itertools.product([0, 1], repeat=n):
-            # Avaliar função objetivo
-            value = 0
-            x = np.array(bits)
-            
-            # Termos lineares
-            for i in range(n):
-                coef = qp.objective.linear.to_dict().get(i, 0)
-                value += coef * x[i]
-            
-            # Termos quadráticos
-            quad_dict = qp.objective.quadratic.to_dict()
-            for (i, j), coef in quad_dict.items():
-                value += coef * x[i] * x[j]
-            
-            # Verificar restrições
-            valid = True
-            for constraint in qp.linear_constraints:
-                lhs = sum(constraint.linear.to_dict().get(i, 0) * x[i] for i in range(n))
-                
-                if constraint.sense.name == 'GE' and lhs < constraint.rhs:
-                    valid = False
-                elif constraint.sense.name == 'LE' and lhs > constraint.rhs:
-                    valid = False
-                elif constraint.sense.name == 'EQ' and lhs != constraint.rhs:
-                    valid = False
-            
-            if valid and value < best_value:
-                best_value = value
-                best_solution = x
-        
-        # Criar objeto de resultado
-        class BruteForceResult:
-            def __init__(self, x, fval):
-                self.x = x
-                self.fval = fval
-                self.status = 'SUCCESS'
+        # Mesmo objetivo do QUBO: -retorno + termos quadráticos i <= j
+        Q = np.triu(self.risk_aversion * self.data.cov_matrix)
+        bits = np.arange(n)
+        
+        x = None
+        best_value = np.inf
+        
+        for start in range(0, 2**n, self.ENUM_CHUNK_SIZE):
+            # Combinações do bloco: linha k tem os bits de k (x_i = bit i)
+            k = np.arange(start, min(start + self.ENUM_CHUNK_SIZE, 2**n))
+            subsets = ((k[:, None] >> bits) & 1).astype(np.float64)
+            
+            # Restrição de número de ativos
+            n_selected = subsets.sum(axis=1)
+            subsets = subsets[(n_selected >= self.MIN_ASSETS) & (n_selected <= self.MAX_ASSETS)]
+            if len(subsets) == 0:
+                continue
+            
+            scores = (-subsets @ self.data.expected_returns
+                      + np.einsum('ij,jk,ik->i', subsets, Q, subsets))
+            
+            best = scores.argmin()
+            if scores[best] < best_value:
+                x, best_value = subsets[best], scores[best]
+        
+        if x is None:
+            raise ValueError("Nenhuma combinação satisfaz as restrições de número de ativos")
         
         print(f"   ✓ Melhor solução encontrada: valor = {best_value:.4f}")
-        return BruteForceResult(best_solution, best_value)
+        return OptimizationResult(
+            x=x,
+            fval=qp.objective.evaluate(x),
+            variables=qp.variables,
+            status=OptimizationResultStatus.SUCCESS
+        )
     
     def interpret_result(self, result):
         """Interpreta resultado quântico e calcula alocação"""
@@ -554,30 +947,44 @@ class QuantumPortfolioOptimizer:
             print("⚠️ Nenhum ativo selecionado")
             return None
         
+        # Subconjunto de retornos e covariância (extraído uma vez e reaproveitado)
+        returns_subset = self.data.expected_returns[selected]
+        cov_subset = self.data.cov_matrix[np.ix_(selected, selected)]
+        
         # Calcular pesos ótimos usando Markowitz nos ativos selecionados
-        weights = self.calculate_weights(selected)
+        weights = self.calculate_weights(selected, cov_subset)
+        
+        # Métricas do portfolio
+        portfolio_return = weights @ returns_subset
+        portfolio_risk = np.sqrt(weights @ cov_subset @ weights)
         
         return {
             'selected_indices': selected,
             'selected_assets': [self.data.assets[i] for i in selected],
             'weights': weights,
-            'allocation': weights * self.budget
+            'allocation': weights * self.budget,
+            'returns_subset': returns_subset,
+            'cov_subset': cov_subset,
+            'expected_return': portfolio_return,
+            'risk': portfolio_risk,
+            'method': result.method
         }
     
-    def calculate_weights(self, selected_indices):
+    def calculate_weights(self, selected_indices, cov_subset=None):
         """Calcula pesos ótimos para ativos selecionados (método clássico)"""
         n = len(selected_indices)
         
-        # Subconjunto de retornos e covariância
-        returns_subset = self.data.expected_returns[selected_indices]
-        cov_subset = self.data.cov_matrix[np.ix_(selected_indices, selected_indices)]
+        # Subconjunto da covariância
+        if cov_subset is None:
+            cov_subset = self.data.cov_matrix[np.ix_(selected_indices, selected_indices)]
         
         # Otimização de Markowitz: minimizar variância para retorno alvo
-        inv_cov = np.linalg.inv(cov_subset)
-        ones = np.ones(n)
+        # Resolve Σz = 1 via Cholesky (Σ é simétrica definida positiva), sem formar Σ⁻¹
+        c, low = cho_factor(cov_subset)
+        z = cho_solve((c, low), np.ones(n))
         
-        # Pesos de variância mínima
-        weights = np.dot(inv_cov, ones) / np.dot(ones, np.dot(inv_cov, ones))
+        # Pesos de variância mínima: Σ⁻¹1 / (1'Σ⁻¹1) = z / soma(z)
+        weights = z / z.sum()
         
         return weights
 
@@ -588,14 +995,67 @@ class QuantumPortfolioOptimizer:
 class PortfolioAnalyzer:
     """Analisador de resultados do portfolio"""
     
-    def __init__(self, data, solution):
+    def __init__(self, data, solution, n_portfolios=1000):
         self.data = data
         self.solution = solution
+        self._figures = {}
+        
+        # Nuvem de portfolios aleatórios, calculada uma vez e reaproveitada nos gráficos
+        self._mc_returns, self._mc_risks = self._simulate_portfolios(n_portfolios)
+        
+        # Sem backend interativo (ex.: servidor, CI) não há janela para exibir
+        self._headless = self._is_non_interactive_backend()
+    
+    @staticmethod
+    def _is_non_interactive_backend():
+        """True se o backend do matplotlib só gera arquivos (agg, pdf, svg, cairo...)"""
+        backend = plt.get_backend().lower()
+        try:
+            from matplotlib.backends import backend_registry, BackendFilter
+            non_interactive = backend_registry.list_builtin(BackendFilter.NON_INTERACTIVE)
+        except ImportError:
+            # matplotlib < 3.9
+            from matplotlib.rcsetup import non_interactive_bk as non_interactive
+        return backend in [b.lower() for b in non_interactive]
+    
+    def _simulate_portfolios(self, n_portfolios):
+        """Simula portfolios aleatórios (uma linha de pesos por portfolio)"""
+        W = np.random.random((n_portfolios, len(self.data.assets)))
+        W /= W.sum(axis=1, keepdims=True)
+        
+        return portfolio_stats(W, self.data.expected_returns, self.data.cov_matrix)
+    
+    def _new_figure(self, name, figsize):
+        """
+        Cria (ou reaproveita) a figura do gráfico. Em modo headless usa
+        Figure + FigureCanvasAgg diretamente, sem a máquina de estados do pyplot.
+        Retorna (fig, reused).
+        """
+        if name in self._figures:
+            return self._figures[name], True
+        
+        if self._headless:
+            fig = Figure(figsize=figsize)
+            FigureCanvasAgg(fig)
+        else:
+            fig = plt.figure(figsize=figsize)
+        
+        self._figures[name] = fig
+        return fig, False
+    
+    def _save_figure(self, fig, filename, leading_newline=False):
+        """Salva a figura em PNG e exibe apenas se houver backend interativo"""
+        fig.savefig(filename, dpi=150, bbox_inches='tight')
+        prefix = "\n" if leading_newline else ""
+        print(f"{prefix}💾 Gráfico salvo: {filename}")
+        if not self._headless:
+            plt.show()
     
     def print_summary(self):
         """Imprime resumo do portfolio otimizado"""
         print("\n" + "="*70)
-        print("📈 PORTFOLIO OTIMIZADO - RESULTADO QUÂNTICO")
+        kind = 'QUÂNTICO' if self.solution['method'] == 'quantum' else 'CLÁSSICO'
+        print(f"📈 PORTFOLIO OTIMIZADO - RESULTADO {kind}")
         print("="*70)
         print(f"🔗 Fonte de Dados: {self.data.data_source}")
         
@@ -606,25 +1066,21 @@ class PortfolioAnalyzer:
         print(f"\n🎯 Ativos Selecionados: {len(selected)}")
         print("-" * 70)
         
-        df = pd.DataFrame({
-            'Ativo': selected,
-            'Peso (%)': weights * 100,
-            'Alocação (R$)': allocation,
-            'Retorno Esperado (%)': self.data.expected_returns[self.solution['selected_indices']],
-            'Preço Atual (R$)': self.data.prices[self.solution['selected_indices']]
-        })
-        
-        print(df.to_string(index=False))
+        header = (f"{'Ativo':<10}{'Peso (%)':>12}{'Alocação (R$)':>16}"
+                  f"{'Retorno Esperado (%)':>24}{'Preço Atual (R$)':>20}")
+        rows = [
+            f"{a:<10}{w:>12.2f}{v:>16.2f}{r:>24.2f}{p:>20.2f}"
+            for a, w, v, r, p in zip(selected,
+                                     weights * 100,
+                                     allocation,
+                                     self.solution['returns_subset'],
+                                     self.data.prices[self.solution['selected_indices']])
+        ]
+        print('\n'.join([header] + rows))
         
-        # Métricas do portfolio
-        portfolio_return = np.dot(weights, 
-                                 self.data.expected_returns[self.solution['selected_indices']])
-        
-        portfolio_risk = np.sqrt(np.dot(weights.T, 
-                                       np.dot(self.data.cov_matrix[np.ix_(
-                                           self.solution['selected_indices'],
-                                           self.solution['selected_indices'])], 
-                                       weights)))
+        # Métricas do portfolio (calculadas em interpret_result)
+        portfolio_return = self.solution['expected_return']
+        portfolio_risk = self.solution['risk']
         
         sharpe_ratio = portfolio_return / (portfolio_risk * 100)
         
@@ -636,7 +1092,12 @@ class PortfolioAnalyzer:
     
     def plot_allocation(self):
         """Visualiza alocação do portfolio"""
-        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+        fig, reused = self._new_figure('allocation', figsize=(14, 6))
+        if reused:
+            self._save_figure(fig, 'portfolio_quantum_allocation.png')
+            return
+        
+        axes = fig.subplots(1, 2)
         
         # Gráfico de pizza - Alocação
         colors = plt.cm.Set3(np.linspace(0, 1, len(self.solution['selected_assets'])))
@@ -663,56 +1124,41 @@ class PortfolioAnalyzer:
             axes[1].text(i, v + 100, f'R$ {v:.0f}', 
                         ha='center', va='bottom', fontweight='bold')
         
-        plt.tight_layout()
-        plt.savefig('portfolio_quantum_allocation.png', dpi=300, bbox_inches='tight')
-        print("\n💾 Gráfico salvo: portfolio_quantum_allocation.png")
-        plt.show()
+        fig.tight_layout()
+        self._save_figure(fig, 'portfolio_quantum_allocation.png', leading_newline=True)
     
     def plot_risk_return(self):
         """Plota fronteira eficiente e portfolio otimizado"""
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        # Simular múltiplos portfolios aleatórios
-        n_portfolios = 1000
-        returns = []
-        risks = []
-        
-        for _ in range(n_portfolios):
-            weights = np.random.random(len(self.data.assets))
-            weights /= weights.sum()
-            
-            ret = np.dot(weights, self.data.expected_returns)
-            risk = np.sqrt(np.dot(weights.T, np.dot(self.data.cov_matrix, weights)))
-            
-            returns.append(ret)
-            risks.append(risk)
+        fig, reused = self._new_figure('risk_return', figsize=(10, 6))
+        if reused:
+            self._save_figure(fig, 'portfolio_quantum_risk_return.png')
+            return
         
-        # Plotar portfolios aleatórios
-        ax.scatter(risks, returns, c='lightblue', alpha=0.5, s=20, label='Portfolios Aleatórios')
+        ax = fig.subplots()
+        quantum = self.solution['method'] == 'quantum'
+        label = 'Portfolio Quântico Otimizado' if quantum else 'Portfolio Clássico Otimizado'
+        title = 'Otimização Quântica' if quantum else 'Otimização Clássica'
         
-        # Portfolio quântico otimizado
-        selected = self.solution['selected_indices']
-        weights = self.solution['weights']
+        # Plotar portfolios aleatórios (simulados no __init__)
+        ax.scatter(self._mc_risks, self._mc_returns, c='lightblue', alpha=0.5, s=20,
+                  label='Portfolios Aleatórios')
         
-        opt_return = np.dot(weights, self.data.expected_returns[selected])
-        opt_risk = np.sqrt(np.dot(weights.T, 
-                                 np.dot(self.data.cov_matrix[np.ix_(selected, selected)], 
-                                       weights)))
+        # Portfolio otimizado
+        opt_return = self.solution['expected_return']
+        opt_risk = self.solution['risk']
         
         ax.scatter(opt_risk, opt_return, c='red', s=200, marker='*', 
-                  label='Portfolio Quântico Otimizado', edgecolors='black', linewidth=2)
+                  label=label, edgecolors='black', linewidth=2)
         
         ax.set_xlabel('Risco (Volatilidade)', fontsize=12)
         ax.set_ylabel('Retorno Esperado (%)', fontsize=12)
-        ax.set_title('Análise Risco x Retorno - Otimização Quântica', 
+        ax.set_title(f'Análise Risco x Retorno - {title}', 
                     fontsize=14, fontweight='bold')
         ax.legend(fontsize=10)
         ax.grid(alpha=0.3)
         
-        plt.tight_layout()
-        plt.savefig('portfolio_quantum_risk_return.png', dpi=300, bbox_inches='tight')
-        print("💾 Gráfico salvo: portfolio_quantum_risk_return.png")
-        plt.show()
+        fig.tight_layout()
+        self._save_figure(fig, 'portfolio_quantum_risk_return.png')
 
 # ============================================================================
 # 5. EXECUÇÃO PRINCIPAL
@@ -732,6 +1178,8 @@ def main():
     BUDGET = 10000  # R$ 10.000
     RISK_AVERSION = 0.5  # Moderado (0 = só retorno, 1 = muito conservador)
     QAOA_REPS = 3  # Camadas do circuito quântico
+    QAOA_OPTIMIZER = 'cobyla'  # 'de' = evolução diferencial em lote (mais lenta, mais robusta)
+    USE_QUANTUM = True  # False = enumeração clássica exata (rápida para até 20 ativos)
     
     # Configuração de dados
     USE_REAL_DATA = True  # True = API real, False = simulado
@@ -749,6 +1197,7 @@ def main():
     print(f"   • Orçamento: R$ {BUDGET:,.2f}")
     print(f"   • Aversão ao Risco: {RISK_AVERSION}")
     print(f"   • Repetições QAOA: {QAOA_REPS}")
+    print(f"   • Otimizador QAOA: {QAOA_OPTIMIZER.upper()}")
     print(f"   • Fonte de Dados: {'API Real' if USE_REAL_DATA else 'Simulado'}")
     
     # ========================================================================
@@ -781,9 +1230,12 @@ def main():
     optimizer = QuantumPortfolioOptimizer(data, BUDGET, RISK_AVERSION)
     
     # Executar otimização quântica
-    result, qp = optimizer.optimize_quantum(reps=QAOA_REPS)
+    result, qp = optimizer.optimize_quantum(
+        reps=QAOA_REPS, optimizer=QAOA_OPTIMIZER, use_quantum=USE_QUANTUM
+    )
     
-    print(f"\n✅ Otimização quântica concluída!")
+    quantum = result.method == 'quantum'
+    print(f"\n✅ Otimização {'quântica' if quantum else 'clássica'} concluída!")
     print(f"   • Valor da função objetivo: {result.fval:.4f}")
     
     # Interpretar resultado
@@ -798,7 +1250,10 @@ def main():
         
         print("\n" + "="*70)
         print("✨ Análise completa!")
-        print("🎓 Portfolio otimizado usando computação quântica (QAOA)")
+        if quantum:
+            print("🎓 Portfolio otimizado usando computação quântica (QAOA)")
+        else:
+            print("🎓 Portfolio otimizado por enumeração clássica exata")
         print("📊 Baseado em dados " + ("REAIS" if USE_REAL_DATA else "SIMULADOS"))
         print("="*70)
         